@@ -1,146 +1,266 @@
-from typing import Dict, List, Optional, Set, Tuple, Any, Union
-from ipaddress import ip_network, ip_network as ip_network_fn, IPv4Network, IPv6Network
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Any, Union
+from ipaddress import ip_address, ip_network, ip_network as ip_network_fn, IPv4Network, IPv6Network
 from dataclasses import dataclass, field
 from collections import defaultdict, deque
+import bisect
+import functools
+import itertools
+import json
+import socket
 import sys
 
+# The same CIDR strings (roots, common supernets) are parsed over and over
+# across rebuilds and incremental adds; memoize the string -> network step.
+# Only node CIDRs go through it, and it is bounded so long-running processes
+# don't keep every CIDR they have ever seen
+_ipnet = functools.lru_cache(maxsize=4096)(ip_network)
+
+@functools.lru_cache(maxsize=1024)
+def _parse_ip(ip: Union[str, int, Any]) -> Tuple[int, int]:
+    """Return (version, integer value) for an IPv4 or IPv6 address.
+
+    Uses inet_pton for the common string forms and falls back to ipaddress
+    for anything else (e.g. scoped IPv6, ints, ipaddress objects), which
+    raises ValueError if invalid. Lookups tend to repeat the same hot
+    addresses, so recent results are memoized.
+    """
+    if not isinstance(ip, str):
+        addr = ip_address(ip)
+        return addr.version, int(addr)
+    for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+        try:
+            return version, int.from_bytes(socket.inet_pton(family, ip), 'big')
+        except (OSError, ValueError):
+            continue
+    addr = ip_address(ip)
+    return addr.version, int(addr)
+
 class CIDRNode:
     """Represents a node in the CIDR tree"""
-    def __init__(self, cidr: str, cidr_obj: Any = None):
+    # Trees hold one node per CIDR; slots drop the per-instance __dict__
+    __slots__ = ('cidr', 'cidr_obj', 'children', 'parent', '_network',
+                 '_version', 'net_int', 'bcast_int', 'prefixlen')
+
+    def __init__(self, cidr: str, *, cidr_obj: Any = None, parent: Optional['CIDRNode'] = None):
         self.cidr = cidr
         self.cidr_obj = cidr_obj
         self.children: List['CIDRNode'] = []
-        self.parent: Optional['CIDRNode'] = None
-        self._network = ip_network(cidr)
-    
-    def is_parent_of(self, other_node: 'CIDRNode') -> bool:
-        """Check if this node is a parent of the other node"""
-        try:
-            parent_net = ip_network(self.cidr)
-            child_net = ip_network(other_node.cidr)
-            
-            if parent_net.version != child_net.version:
-                return False
-                
-            return (parent_net.network_address <= child_net.network_address and 
-                   parent_net.broadcast_address >= child_net.broadcast_address and
-                   parent_net.prefixlen < child_net.prefixlen)
-        except Exception:
-            return False
+        self.parent = parent
+        self._network = _ipnet(cidr)
+        # Integer bounds so containment checks are plain int comparisons
+        self._version = self._network.version
+        self.net_int = int(self._network.network_address)
+        self.bcast_int = int(self._network.broadcast_address)
+        self.prefixlen = self._network.prefixlen
     
     @property
     def network(self):
         return self._network
     
+    def contains_cidr(self, cidr_str: str) -> bool:
+        """Return True if this node's CIDR contains the given cidr_str.
+
+        Host bits in cidr_str are ignored. Raises ValueError if cidr_str is
+        not a valid CIDR.
+        """
+        # Not memoized: callers pass arbitrary strings
+        other = ip_network(cidr_str, False)
+        return (
+            other.version == self._version and
+            self.net_int <= int(other.network_address) and
+            self.bcast_int >= int(other.broadcast_address)
+        )
+    
     def is_parent_of(self, other: 'CIDRNode') -> bool:
         """Check if this node is a parent of another node"""
-        if self._network.version != other._network.version:
-            return False
         return (
-            self._network.network_address <= other._network.network_address and
-            self._network.broadcast_address >= other._network.broadcast_address and
-            self._network.prefixlen < other._network.prefixlen
+            self._version == other._version and
+            self.net_int <= other.net_int and
+            self.bcast_int >= other.bcast_int and
+            self.prefixlen < other.prefixlen
         )
 
+def _split_cidr(cidr: Union[str, Any]) -> Tuple[str, Any]:
+    """Return (interned CIDR string, CIDR object or None) for a string or ipam.CIDR-like object.
+
+    ipam.CIDR's cached cidr_str is used when present, so its lazily built
+    network object is never touched.
+    """
+    cidr_str = getattr(cidr, 'cidr_str', None)
+    if cidr_str is not None:
+        return sys.intern(cidr_str), cidr
+    if hasattr(cidr, 'cidr'):  # Other objects carrying a network
+        return sys.intern(str(cidr.cidr)), cidr
+    return sys.intern(str(cidr)), None
+
+def _address_key(node: CIDRNode) -> Tuple[int, int]:
+    """Order sibling nodes by IP version, then network address"""
+    return node._version, node.net_int
+
+def _insert_by_address(nodes: List[CIDRNode], node: CIDRNode) -> None:
+    """Insert node into a list kept ordered by _address_key"""
+    key = _address_key(node)
+    lo, hi = 0, len(nodes)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _address_key(nodes[mid]) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    nodes.insert(lo, node)
+
+class _BitTrie:
+    """Binary trie over network address bits (MSB first), one root per IP version.
+
+    A CIDR a.b.c.d/n lives n levels below its version's root, so the
+    deepest stored CIDR covering a network is found in at most 32 (IPv4)
+    or 128 (IPv6) steps regardless of how many CIDRs are stored.
+
+    Trie nodes are indexes into parallel flat lists rather than objects:
+    the children of node i are _zero[i] and _one[i] (0 meaning absent) and
+    the CIDR stored at node i is _payload[i]. Index 0 is the IPv4 root and
+    index 1 the IPv6 root, so no real child is ever 0.
+    """
+    _ROOTS = {4: 0, 6: 1}
+    # Walking the address as a string of '0'/'1' characters is cheaper in
+    # CPython than shifting and masking a (possibly 128-bit) int per level
+    _BITS = {4: '032b', 6: '0128b'}
+
+    def __init__(self):
+        self._zero: List[int] = [0, 0]
+        self._one: List[int] = [0, 0]
+        self._payload: List[Optional[CIDRNode]] = [None, None]
+
+    def insert(self, version: int, addr: int, prefixlen: int, node: CIDRNode) -> Optional[CIDRNode]:
+        """Store node at the slot for addr/prefixlen and return the deepest entry covering it.
+
+        The returned entry is the nearest stored ancestor with a strictly
+        shorter prefix (None at the top level). If the slot is already taken,
+        e.g. by another spelling of the same network, the first occupant is
+        kept. Finding the parent and inserting share a single walk down the trie.
+        """
+        zero, one, payload = self._zero, self._one, self._payload
+        cur = self._ROOTS[version]
+        best = None
+        for bit in format(addr, self._BITS[version])[:prefixlen]:
+            if payload[cur] is not None:
+                best = payload[cur]
+            child = one if bit == '1' else zero
+            nxt = child[cur]
+            if not nxt:
+                nxt = child[cur] = len(payload)
+                payload.append(None)
+                zero.append(0)
+                one.append(0)
+            cur = nxt
+        if payload[cur] is None:
+            payload[cur] = node
+        return best
+
+    def longest_match(self, version: int, addr: int, max_len: int) -> Optional[CIDRNode]:
+        """Return the deepest stored node of prefix length <= max_len covering addr"""
+        if max_len < 0:
+            return None
+        zero, one, payload = self._zero, self._one, self._payload
+        cur = self._ROOTS[version]
+        best = payload[cur]
+        for bit in format(addr, self._BITS[version])[:max_len]:
+            cur = one[cur] if bit == '1' else zero[cur]
+            if not cur:
+                break
+            stored = payload[cur]
+            if stored is not None:
+                best = stored
+        return best
+
 class CIDRTree:
     """Manages a tree of CIDRs for hierarchical visualization"""
     
     def __init__(self):
+        # Bumped on every structural change so callers can cache derived data
+        self._generation = 0
+        self._clear()
+    
+    def _clear(self) -> None:
+        """Reset to an empty tree"""
         self.roots: List[CIDRNode] = []
         self.cidr_map: Dict[str, CIDRNode] = {}
+        self._trie = _BitTrie()
+        # Per IP version, every node ordered by (net_int, prefixlen) as packed
+        # _range_key ints, with the nodes in a parallel list
+        self._range_keys: Dict[int, List[int]] = {4: [], 6: []}
+        self._range_nodes: Dict[int, List[CIDRNode]] = {4: [], 6: []}
+        # Serialized getCidrTree results keyed by cidrString (None for the whole
+        # tree); cleared whenever the tree changes
+        self._json_cache: Dict[Optional[str], str] = {}
+    
+    @staticmethod
+    def _range_key(net_int: int, prefixlen: int) -> int:
+        """Sort key ordering nodes by network address, then shorter prefix first"""
+        return (net_int << 8) | prefixlen
     
     def add_cidr(self, cidr: Union[str, Any]) -> None:
         """Add a CIDR to the tree"""
-        if hasattr(cidr, 'cidr'):  # If it's a CIDR object from ipam.py
-            cidr_str = str(cidr.cidr)
-            cidr_obj = cidr
-        else:  # It's a string
-            cidr_str = str(cidr)
-            cidr_obj = None
+        cidr_str, cidr_obj = _split_cidr(cidr)
             
         if cidr_str in self.cidr_map:
             return
             
         try:
-            node = CIDRNode(cidr_str, cidr_obj)
-            
-            # First, find and remove any existing nodes that are now children of this one
-            children_to_remove = []
-            for existing_cidr, existing_node in list(self.cidr_map.items()):
-                try:
-                    if node.is_parent_of(existing_node):
-                        children_to_remove.append(existing_node)
-                except Exception:
-                    continue
-            
-            # Add the new node
-            self.cidr_map[cidr_str] = node
-            
-            # Find parent for the new node
-            parent = self._find_parent(cidr_str)
-            
-            if parent is None:
-                # This is a new root
-                self.roots.append(node)
-            else:
-                # Add as child to the parent
-                parent.children.append(node)
-                node.parent = parent
-                
-                # If this node was a root, remove it
-                if node in self.roots:
-                    self.roots.remove(node)
-            
-            # Reparent any children
-            for child in children_to_remove:
-                if child.parent:
-                    child.parent.children.remove(child)
-                node.children.append(child)
-                child.parent = node
-                # If child was a root, remove it
-                if child in self.roots:
-                    self.roots.remove(child)
-                    
+            node = CIDRNode(cidr_str, cidr_obj=cidr_obj)
         except ValueError as e:
             print(f"Error adding CIDR {cidr_str}: {e}", file=sys.stderr)
-            if cidr_str in self.cidr_map:
-                del self.cidr_map[cidr_str]
+            return
+            
+        self.cidr_map[cidr_str] = node
+        self._json_cache.clear()
+        self._generation += 1
+        
+        # The parent is the deepest existing CIDR covering the new one
+        parent = self._trie.insert(node._version, node.net_int, node.prefixlen, node)
+        
+        # Existing nodes inside the new range that currently hang off the new
+        # node's parent (or are roots) move beneath it. They sit in a contiguous
+        # slice of the range-sorted list, so they are found (and appended) in
+        # address order; after each one, skip its own subtree.
+        keys = self._range_keys[node._version]
+        range_nodes = self._range_nodes[node._version]
+        key = self._range_key(node.net_int, node.prefixlen)
+        pos = bisect.bisect_right(keys, key)
+        end = bisect.bisect_right(keys, self._range_key(node.bcast_int, 0xFF), pos)
+        i = pos
+        while i < end:
+            candidate = range_nodes[i]
+            if candidate.parent is parent:
+                node.children.append(candidate)
+                candidate.parent = node
+                i = bisect.bisect_right(keys, self._range_key(candidate.bcast_int, 0xFF), i, end)
+            else:
+                i += 1
+        keys.insert(pos, key)
+        range_nodes.insert(pos, node)
+        
+        siblings = parent.children if parent is not None else self.roots
+        if node.children:
+            siblings[:] = [sibling for sibling in siblings if sibling.parent is parent]
+        _insert_by_address(siblings, node)
+        node.parent = parent
     
-    def _find_parent(self, cidr: str) -> Optional[CIDRNode]:
-        """Find the immediate parent CIDR in the tree"""
-        try:
-            network = ip_network(cidr)
-            parent = None
+    def lookup(self, ip: str) -> Optional[CIDRNode]:
+        """
+        Find the most specific CIDR in the tree containing an IP address
+        
+        Args:
+            ip: IPv4 or IPv6 address string
             
-            for existing_cidr, existing_node in self.cidr_map.items():
-                try:
-                    if existing_cidr == cidr:
-                        continue  # Skip self
-                        
-                    existing_network = ip_network(existing_cidr)
-                    
-                    # Skip if not the same address family
-                    if existing_network.version != network.version:
-                        continue
-                        
-                    # Check if existing CIDR is a direct parent
-                    if (existing_network.network_address <= network.network_address and
-                        existing_network.broadcast_address >= network.broadcast_address and
-                        existing_network.prefixlen < network.prefixlen):
-                        
-                        # If we haven't found a parent yet, or this one is more specific
-                        if parent is None or ip_network(parent.cidr).prefixlen < existing_network.prefixlen:
-                            parent = existing_node
-                        
-                except ValueError:
-                    # Skip invalid CIDRs
-                    continue
-                    
-            return parent
+        Returns:
+            The deepest matching CIDRNode, or None if no CIDR contains the address
             
-        except ValueError as e:
-            print(f"Error processing CIDR {cidr}: {e}", file=sys.stderr)
-            return None
+        Raises:
+            ValueError: If ip is not a valid IP address
+        """
+        version, addr = _parse_ip(ip)
+        return self._trie.longest_match(version, addr, 32 if version == 4 else 128)
     
     def build_tree(self, cidrs: List[Union[str, Any]]) -> None:
         """
@@ -151,66 +271,44 @@ class CIDRTree:
         """
         self.build_tree_from_list(cidrs)
     
-    def build_tree_from_list(self, cidrs: List[Union[str, Any]]) -> None:
+    def build_tree_from_list(self, cidrs: Iterable[Union[str, Any]]) -> None:
         """
         Optimized tree building when all CIDRs are provided upfront.
-        Sorts by prefix length (shorter masks first) for efficient hierarchy construction.
+        Sorts by network address (covering CIDRs first) for efficient hierarchy construction,
+        which also leaves every child list in address order.
         
         Args:
-            cidrs: List of CIDR strings or objects
+            cidrs: Iterable of CIDR strings or objects; replaces the current tree
         """
-        if not cidrs:
-            return
-            
         try:
-            # Convert all CIDRs to string representation and sort by prefix length (shorter first)
-            cidr_entries = []
+            # Create one node per distinct CIDR string (first occurrence wins)
+            nodes: Dict[str, CIDRNode] = {}
             for cidr in cidrs:
-                if hasattr(cidr, 'cidr'):  # CIDR object
-                    cidr_str = str(cidr.cidr)
-                    cidr_entries.append((cidr_str, cidr, ip_network(cidr_str).prefixlen))
-                else:  # String
-                    cidr_str = str(cidr)
-                    cidr_entries.append((cidr_str, cidr, ip_network(cidr_str).prefixlen))
-            
-            # Sort by prefix length (shorter first) and then by network address
-            cidr_entries.sort(key=lambda x: (x[2], ip_network(x[0]).network_address))
+                cidr_str, cidr_obj = _split_cidr(cidr)
+                if cidr_str not in nodes:
+                    nodes[cidr_str] = CIDRNode(cidr_str, cidr_obj=cidr_obj)
             
             # Clear existing tree
-            self.roots = []
-            self.cidr_map = {}
+            self._clear()
+            self._generation += 1
             
-            # Add CIDRs in order (from shortest to longest prefix)
-            for cidr_str, cidr_obj, _ in cidr_entries:
-                if cidr_str in self.cidr_map:
-                    continue
-                    
-                node = CIDRNode(cidr_str, cidr_obj if hasattr(cidr_obj, 'cidr') else None)
-                self.cidr_map[cidr_str] = node
-                
-                # Find the best parent
-                parent = None
-                parent_prefix_len = -1
+            # Bucket by version in a single pass, then order each bucket by network
+            # address with shorter prefixes first, so every CIDR follows its parents
+            range_nodes: Dict[int, List[CIDRNode]] = {4: [], 6: []}
+            for node in nodes.values():
+                range_nodes[node._version].append(node)
+            for version, version_nodes in range_nodes.items():
+                version_nodes.sort(key=lambda n: self._range_key(n.net_int, n.prefixlen))
+                self._range_keys[version] = [self._range_key(n.net_int, n.prefixlen) for n in version_nodes]
+            self._range_nodes = range_nodes
+            
+            # Add CIDRs in order (IPv4 then IPv6, by address); children and roots
+            # are appended in address order
+            for node in itertools.chain(range_nodes[4], range_nodes[6]):
+                self.cidr_map[node.cidr] = node
                 
-                for existing_cidr, existing_node in self.cidr_map.items():
-                    if existing_cidr == cidr_str:
-                        continue
-                        
-                    try:
-                        existing_net = ip_network(existing_cidr)
-                        current_net = ip_network(cidr_str)
-                        
-                        if (existing_net.version == current_net.version and
-                            existing_net.network_address <= current_net.network_address and
-                            existing_net.broadcast_address >= current_net.broadcast_address and
-                            existing_net.prefixlen < current_net.prefixlen and
-                            existing_net.prefixlen > parent_prefix_len):
-                            
-                            parent = existing_node
-                            parent_prefix_len = existing_net.prefixlen
-                            
-                    except ValueError:
-                        continue
+                # The best parent is the deepest CIDR already in the trie covering this one
+                parent = self._trie.insert(node._version, node.net_int, node.prefixlen, node)
                 
                 if parent is not None:
                     parent.children.append(node)
@@ -222,6 +320,68 @@ class CIDRTree:
             print(f"Error building tree from list: {e}", file=sys.stderr)
             raise
     
+    def formTreeFromCidrList(self, cidr_list: List[str]) -> None:
+        """
+        Replace the tree with one built from a flat list of CIDR strings
+        
+        Unlike build_tree_from_list, host bits are accepted and masked off, as
+        the draft module this entry point came from did: 10.0.0.1/8 is added
+        (and keyed in getCidrTree) as 10.0.0.0/8.
+        
+        Args:
+            cidr_list: List of CIDR strings
+        """
+        self.build_tree_from_list([str(_ipnet(cidr, False)) for cidr in cidr_list])
+    
+    def getCidrTree(self, cidrString: Optional[str]) -> str:
+        """
+        Serialize a subtree as nested JSON objects keyed by CIDR string
+        
+        Args:
+            cidrString: CIDR to start from, or None for the whole tree (keyed "null")
+            
+        Returns:
+            JSON text, or "{}" if cidrString is not in the tree
+        """
+        cached = self._json_cache.get(cidrString)
+        if cached is not None:
+            return cached
+        if cidrString is None:
+            result = '{"null": %s}' % self._children_to_json(self.roots)
+        else:
+            node = self.cidr_map.get(cidrString)
+            if not node:
+                return json.dumps({})
+            result = '{%s: %s}' % (json.dumps(cidrString), self._children_to_json(node.children))
+        self._json_cache[cidrString] = result
+        return result
+    
+    @staticmethod
+    def _children_to_json(children: List[CIDRNode]) -> str:
+        """Nested JSON object for a list of sibling nodes and their descendants.
+
+        Writes the same text as json.dumps on the nested dict, straight into a
+        list buffer. Iterative so deep (e.g. IPv6) chains don't hit the
+        recursion limit. Keys go through json.dumps, as scoped IPv6 CIDRs
+        (e.g. fe80::%eth0/64) may contain characters that need escaping.
+        """
+        parts = ['{']
+        stack = [iter(children)]
+        need_sep = False
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                parts.append('}')
+                need_sep = True
+                continue
+            if need_sep:
+                parts.append(', ')
+            parts.append('%s: {' % json.dumps(child.cidr))
+            stack.append(iter(child.children))
+            need_sep = False
+        return ''.join(parts)
+    
     def print_tree(self, root_cidr: Optional[str] = None) -> str:
         """Print the tree in a tree-like structure"""
         result = []
@@ -231,36 +391,33 @@ class CIDRTree:
                 return f"CIDR {root_cidr} not found in tree\n"
             self._print_node(self.cidr_map[root_cidr], "", True, result)
         else:
-            # Sort roots by network address for consistent output
-            sorted_roots = sorted(self.roots, key=lambda x: ip_network(x.cidr))
-            for i, root in enumerate(sorted_roots):
-                is_last = (i == len(sorted_roots) - 1)
+            # Roots are kept in network address order
+            for i, root in enumerate(self.roots):
+                is_last = (i == len(self.roots) - 1)
                 self._print_node(root, "", is_last, result)
         
         return "\n".join(result)
     
     def _print_node(self, node: CIDRNode, prefix: str, is_last: bool, result: List[str], depth: int = 0, max_depth: int = 10) -> None:
-        """Recursively print a node and its children"""
-        if depth > max_depth:
-            result.append(f"{prefix}└── ... (max depth reached)")
-            return
+        """Print a node and its children (already in address order) using an explicit stack"""
+        stack = [(node, prefix, is_last, depth)]
+        while stack:
+            node, prefix, is_last, depth = stack.pop()
+            if depth > max_depth:
+                result.append(f"{prefix}└── ... (max depth reached)")
+                continue
+                
+            connector = "└── " if is_last else "├── "
+            result.append(f"{prefix}{connector}{node.cidr}")
             
-        connector = "└── " if is_last else "├── "
-        result.append(f"{prefix}{connector}{node.cidr}")
-        
-        # Update prefix for children
-        new_prefix = prefix + ("    " if is_last else "│   ")
-        
-        # Sort children by network address for consistent output
-        try:
-            sorted_children = sorted(node.children, key=lambda x: ip_network(x.cidr))
+            # Update prefix for children
+            new_prefix = prefix + ("    " if is_last else "│   ")
             
-            # Print children
-            for i, child in enumerate(sorted_children):
-                is_last_child = (i == len(sorted_children) - 1)
-                self._print_node(child, new_prefix, is_last_child, result, depth + 1, max_depth)
-        except Exception as e:
-            result.append(f"{new_prefix}└── [Error: {str(e)}]")
+            # Push children in reverse so the first child is printed first
+            children = node.children
+            last = len(children) - 1
+            for i in range(last, -1, -1):
+                stack.append((children[i], new_prefix, i == last, depth + 1))
 
 def tree(cidr: str, cidrs: List[Union[str, Any]]) -> str:
     """
@@ -1,19 +1,110 @@
 import ipaddress
 import json
+import os
+import socket
 import sys
-from typing import Dict, List, Optional, Set, Tuple, Any, Union
+import threading
+from collections import defaultdict
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Any, Union
 from abc import ABC, abstractmethod
 from ipaddress import ip_network, ip_address
-from src.cidrtree import CIDRTree, CIDRNode
+from src.cidrtree import CIDRTree, CIDRNode, _parse_ip
+
+try:
+    import orjson
+except ImportError:  # Optional; the stdlib json module is used without it
+    orjson = None
+
+def _read_json(file_path: str) -> Any:
+    """Parse a JSON file, using orjson when it is installed"""
+    if orjson is not None:
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+def _copy_tags(tags: Mapping[str, str]) -> Dict[str, str]:
+    """Copy a tags mapping read from JSON, interning its keys.
+
+    The same few keys recur on every CIDR; interned, the tags dicts all share
+    one string per key instead of one per parsed document.
+    """
+    return {sys.intern(key): value for key, value in tags.items()}
+
+# Shared empty result for get_cidr_tags misses
+_NO_TAGS: Mapping[str, str] = MappingProxyType({})
+
+def _parse_ipv4_cidr(cidr: Any) -> Optional[Tuple[str, int, int]]:
+    """Return (canonical string, network int, prefix length) for a plain "a.b.c.d/n" string.
+
+    Returns None for anything else (IPv6, netmask notation, host bits set,
+    malformed input) so the caller can fall back to ipaddress, which
+    handles those forms and raises the appropriate ValueError.
+    """
+    if not isinstance(cidr, str):
+        return None
+    addr, sep, pfx = cidr.partition('/')
+    if not (sep and pfx.isascii() and pfx.isdigit() and len(pfx) <= 2):
+        return None
+    prefixlen = int(pfx)
+    if prefixlen > 32:
+        return None
+    try:
+        # inet_pton, unlike inet_aton, rejects shorthand such as "10.1"
+        packed = socket.inet_pton(socket.AF_INET, addr)
+    except OSError:
+        return None
+    net_int = int.from_bytes(packed, 'big')
+    if net_int & (0xFFFFFFFF >> prefixlen):
+        return None
+    return f"{socket.inet_ntoa(packed)}/{prefixlen}", net_int, prefixlen
 
 class CIDR:
-    def __init__(self, cidr: str, cidr_type: str, tags: Optional[Dict[str, str]] = None):
-        self.cidr = ipaddress.ip_network(cidr)
-        self.cidr_str = str(self.cidr)  # Store string representation for easier comparison
+    # IPAM holds one of these per CIDR; slots drop the per-instance __dict__
+    __slots__ = ('_cidr', 'cidr_str', '_version', '_net_int', '_prefixlen', '_mask_int',
+                 '_hash', 'cidr_type', 'tags', '_tree', '_ipam', '_parent',
+                 '_children', '_children_cache')
+
+    def __init__(self, cidr: Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network],
+                 cidr_type: str, tags: Optional[Dict[str, str]] = None):
+        # Plain IPv4 strings are decoded directly; the ipaddress object behind
+        # .cidr is then only built if someone asks for it
+        parsed = _parse_ipv4_cidr(cidr)
+        if parsed is not None:
+            self._cidr: Union[ipaddress.IPv4Network, ipaddress.IPv6Network, None] = None
+            cidr_str, self._net_int, self._prefixlen = parsed
+            self._version, max_prefixlen = 4, 32
+        else:
+            # Network objects are used as they are; ip_network would re-parse them
+            self._cidr = cidr if isinstance(cidr, (ipaddress.IPv4Network, ipaddress.IPv6Network)) \
+                else ipaddress.ip_network(cidr)
+            cidr_str = str(self._cidr)
+            self._version = self._cidr.version
+            self._net_int = int(self._cidr.network_address)
+            self._prefixlen = self._cidr.prefixlen
+            max_prefixlen = self._cidr.max_prefixlen
+        # Store string representation for easier comparison; interned because it
+        # is the key for IPAM.cidrs and the tree's cidr_map
+        self.cidr_str = sys.intern(cidr_str)
+        # Integer form so containment checks are a mask and compare
+        self._mask_int = (-1 << (max_prefixlen - self._prefixlen)) & ((1 << max_prefixlen) - 1)
+        self._hash = hash((self._version, self._net_int, self._prefixlen))
         self.cidr_type = cidr_type
         self.tags = tags or {}
         self._tree: Optional[CIDRTree] = None
+        self._ipam: Optional['IPAM'] = None  # Owning IPAM, whose tag index follows add_tag/remove_tag
         self._parent: Optional['CIDR'] = None
+        self._children: List['CIDR'] = []  # Filled only by add_child
+        # (tree, tree generation, child CIDRs) from the last children lookup
+        self._children_cache: Optional[Tuple[CIDRTree, int, List['CIDR']]] = None
+        
+    @property
+    def cidr(self) -> Union[ipaddress.IPv4Network, ipaddress.IPv6Network]:
+        """The ipaddress network object for this CIDR"""
+        if self._cidr is None:
+            self._cidr = ipaddress.IPv4Network((self._net_int, self._prefixlen))
+        return self._cidr
         
     def __str__(self) -> str:
         return self.cidr_str
@@ -24,23 +115,33 @@ class CIDR:
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, CIDR):
             return False
-        return self.cidr == other.cidr
+        return (
+            self._net_int == other._net_int and
+            self._prefixlen == other._prefixlen and
+            self._version == other._version
+        )
         
     def __hash__(self) -> int:
-        return hash(self.cidr)
+        return self._hash
 
     def add_tag(self, key: str, value: str) -> None:
         """Add a tag to the CIDR"""
-        self.tags[key] = value
+        if self._ipam is not None:
+            self._ipam._set_tag(self, key, value)
+        else:
+            self.tags[key] = value
 
     def remove_tag(self, key: str) -> None:
         """Remove a tag from the CIDR"""
-        if key in self.tags:
+        if self._ipam is not None:
+            self._ipam._remove_tag(self, key)
+        elif key in self.tags:
             del self.tags[key]
 
-    def get_tags(self) -> Dict[str, str]:
-        """Get all tags for this CIDR"""
-        return self.tags.copy()
+    def get_tags(self) -> Mapping[str, str]:
+        """Get a read-only, live view of this CIDR's tags (use dict() for a snapshot)"""
+        # Built per call, so it follows reassignment of self.tags
+        return MappingProxyType(self.tags)
     
     @property
     def parent(self) -> Optional['CIDR']:
@@ -54,32 +155,54 @@ class CIDR:
         
     @property
     def children(self) -> List['CIDR']:
-        """Get child CIDRs"""
-        if not self._tree:
+        """Get child CIDRs (a shared list; do not modify it)"""
+        tree = self._tree
+        if not tree:
             return []
             
-        # Get the node for this CIDR
-        node = self._tree.cidr_map.get(str(self.cidr))
-        if not node:
-            return []
+        # Reuse the last result until the tree changes
+        cached = self._children_cache
+        if cached is not None and cached[0] is tree and cached[1] == tree._generation:
+            return cached[2]
             
-        # Return the CIDR objects for the children
-        return [child.cidr_obj for child in node.children if hasattr(child, 'cidr_obj')]
+        # Get the node for this CIDR and collect the CIDR objects for its children
+        node = tree.cidr_map.get(self.cidr_str)
+        children = [child.cidr_obj for child in node.children if child.cidr_obj is not None] if node else []
+        self._children_cache = (tree, tree._generation, children)
+        return children
         
     def add_child(self, child: 'CIDR') -> None:
         """Add a child CIDR"""
-        if not hasattr(self, '_children'):
-            self._children = []
         self._children.append(child)
         child.parent = self
 
     def is_parent_of(self, other: 'CIDR') -> bool:
         """Check if this CIDR is a parent of another CIDR"""
-        return self.cidr.supernet_of(other.cidr)
+        return (
+            other._version == self._version and
+            other._prefixlen >= self._prefixlen and
+            (other._net_int & self._mask_int) == self._net_int
+        )
     
     def is_child_of(self, other: 'CIDR') -> bool:
         """Check if this CIDR is a child of another CIDR"""
-        return self.cidr.subnet_of(other.cidr)
+        return other.is_parent_of(self)
+    
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]], default_type: str = 'VPC') -> Dict[str, 'CIDR']:
+        """
+        Build CIDRs from {'cidr', 'type', 'tags'} records, as found in the JSON data files
+        
+        Args:
+            records: Records to build CIDRs from; 'type' and 'tags' are optional
+            default_type: Type for records without one
+            
+        Returns:
+            The CIDRs keyed by their string form; pass the values to IPAM.add_cidrs
+        """
+        cidrs = (cls(record['cidr'], record.get('type', default_type), _copy_tags(record.get('tags') or {}))
+                 for record in records)
+        return {cidr.cidr_str: cidr for cidr in cidrs}
     
     @classmethod
     def build_hierarchy(cls, cidrs: List['CIDR']) -> None:
@@ -94,16 +217,16 @@ class CIDR:
             
         tree = CIDRTree()
         
-        # First pass: add all CIDRs to the tree
-        for cidr in cidrs:
-            tree.add_cidr(cidr)
+        # First pass: build the tree in one go; build_tree_from_list orders the
+        # CIDRs so every parent is inserted before its children
+        tree.build_tree_from_list(cidrs)
             
         # Second pass: set the tree reference and parent-child relationships
         for cidr in cidrs:
             cidr._tree = tree
             
             # Get the node for this CIDR
-            node = tree.cidr_map.get(str(cidr.cidr))
+            node = tree.cidr_map.get(cidr.cidr_str)
             if node and node.parent and hasattr(node.parent, 'cidr_obj'):
                 cidr._parent = node.parent.cidr_obj
 
@@ -114,101 +237,233 @@ class CloudProvider(ABC):
         pass
 
 class TestProvider(CloudProvider):
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: Optional[str]):
         self.file_path = file_path
+        # (st_mtime_ns, parsed data) for the last read of file_path
+        self._cache: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._data: Optional[Dict[str, Any]] = None  # Set by from_dict
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TestProvider':
+        """Create a provider that serves already-parsed data instead of reading a file"""
+        provider = cls(None)
+        provider._data = data
+        return provider
 
     def load_cidrs(self) -> Dict[str, Any]:
-        """Load CIDRs from a local test file"""
-        with open(self.file_path, 'r') as f:
-            data = json.load(f)
-            return data
+        """Load CIDRs from a local test file, reusing the parsed data until the file changes"""
+        if self.file_path is None:
+            return self._data
+        mtime_ns = os.stat(self.file_path).st_mtime_ns
+        if self._cache is not None and self._cache[0] == mtime_ns:
+            return self._cache[1]
+        data = _read_json(self.file_path)
+        self._cache = (mtime_ns, data)
+        return data
             
     def get_cidr_blocks(self) -> List[CIDR]:
         """Get CIDR blocks as CIDR objects"""
-        cidrs = []
-        data = self.load_cidrs()
-        for cidr_info in data.get('cidrs', []):
-            cidr = CIDR(
-                cidr=cidr_info['cidr'],
-                cidr_type=cidr_info.get('type', 'VPC'),
-                tags=cidr_info.get('tags', {})
-            )
-            cidrs.append(cidr)
-        return cidrs
+        # Tags are copied: the parsed data is cached and shared between calls
+        return [CIDR(cidr_info['cidr'], cidr_info.get('type', 'VPC'), _copy_tags(cidr_info.get('tags') or {}))
+                for cidr_info in self.load_cidrs().get('cidrs', [])]
 
 
 # AWSProvider has been moved to aws_provider.py
 
+class _V4Tables:
+    """IPv4 longest-prefix tables over IPAM's CIDRs.
+
+    direct holds the most specific CIDR of /16 or shorter for each /16;
+    longer prefixes live in one map per prefix length, keyed by network
+    shifted down to its prefix bits. IPAM never edits published tables: it
+    fills a copy and swaps it in, so lock-free readers see a consistent set.
+    """
+    __slots__ = ('direct', 'long', 'long_lens')
+
+    def __init__(self, direct: Optional[List[Optional[CIDR]]] = None,
+                 long: Optional[Dict[int, Dict[int, CIDR]]] = None):
+        self.direct = direct if direct is not None else [None] * (1 << 16)
+        self.long = long if long is not None else {}
+        self.long_lens = sorted(self.long, reverse=True)  # Keys of long, longest first
+
+    def copy(self) -> '_V4Tables':
+        return _V4Tables(list(self.direct), {prefixlen: dict(table) for prefixlen, table in self.long.items()})
+
+    def add(self, cidr: CIDR) -> None:
+        """Add an IPv4 CIDR to the tables"""
+        prefixlen = cidr._prefixlen
+        if prefixlen > 16:
+            table = self.long.get(prefixlen)
+            if table is None:
+                table = self.long[prefixlen] = {}
+                self.long_lens = sorted(self.long, reverse=True)
+            table[cidr._net_int >> (32 - prefixlen)] = cidr
+            return
+        direct = self.direct
+        start = cidr._net_int >> 16
+        for i in range(start, start + (1 << (16 - prefixlen))):
+            current = direct[i]
+            if current is None or current._prefixlen <= prefixlen:
+                direct[i] = cidr
+
+    def find(self, addr: int) -> Optional[CIDR]:
+        """Most specific CIDR containing the IPv4 address addr"""
+        # Probe only the prefix lengths longer than /16 that exist, longest
+        # first, then fall back to the direct /16 table
+        for prefixlen in self.long_lens:
+            cidr = self.long[prefixlen].get(addr >> (32 - prefixlen))
+            if cidr is not None:
+                return cidr
+        return self.direct[addr >> 16]
+
 class IPAM:
+    """IP address manager over static and cloud CIDRs.
+
+    Safe to share between threads: loads, tag changes, hierarchy builds and
+    every query that reads the CIDRs, the tag index or the tree hold one
+    re-entrant lock. The one exception is IPv4 find_containing_cidr(s) on a
+    built hierarchy, which reads published lookup tables that are never
+    modified in place, and takes no lock.
+    """
     def __init__(self, cloud_provider: Optional[CloudProvider] = None):
         self.cidrs: Dict[str, CIDR] = {}
         self.cloud_provider = cloud_provider
         self.cidr_tree = CIDRTree()
         self._cidrs_loaded = False
+        self._lock = threading.RLock()
+        # (tag key, tag value) -> CIDRs carrying that tag
+        self._tag_index: Dict[Tuple[str, str], Set[CIDR]] = defaultdict(set)
+        # IPv4 longest-prefix tables, filled with the hierarchy
+        self._v4_tables = _V4Tables()
+
+    def _index_tag(self, cidr: CIDR, key: str) -> None:
+        """Add cidr's current value for tag key to the tag index"""
+        self._tag_index[(key, cidr.tags[key])].add(cidr)
+
+    def _unindex_tag(self, cidr: CIDR, key: str) -> None:
+        """Remove cidr's current value for tag key (if any) from the tag index"""
+        if key in cidr.tags:
+            tag = (key, cidr.tags[key])
+            tagged = self._tag_index.get(tag)
+            if tagged is not None:
+                tagged.discard(cidr)
+                if not tagged:
+                    del self._tag_index[tag]
+
+    def _set_tag(self, cidr: CIDR, key: str, value: str) -> None:
+        """Set a tag on one of this IPAM's CIDRs, keeping the tag index current"""
+        with self._lock:
+            self._unindex_tag(cidr, key)
+            cidr.tags[key] = value
+            self._index_tag(cidr, key)
+
+    def _remove_tag(self, cidr: CIDR, key: str) -> None:
+        """Remove a tag from one of this IPAM's CIDRs, keeping the tag index current"""
+        with self._lock:
+            if key in cidr.tags:
+                self._unindex_tag(cidr, key)
+                del cidr.tags[key]
+
+    def _store_cidrs(self, cidrs: Iterable[CIDR]) -> None:
+        """Store CIDRs under the lock, publishing updated IPv4 tables once at the end"""
+        with self._lock:
+            v4_tables = self._v4_tables.copy() if self._cidrs_loaded else None
+            try:
+                for cidr in cidrs:
+                    self._store_cidr(cidr, v4_tables)
+            finally:
+                if v4_tables is not None:
+                    self._v4_tables = v4_tables
+
+    def _store_cidr(self, cidr: CIDR, v4_tables: Optional[_V4Tables]) -> None:
+        """Store a CIDR and index its tags, replacing any existing entry for the same network"""
+        key = cidr.cidr_str
+        old = self.cidrs.get(key)
+        if old is not None:
+            for tag_key in list(old.tags):
+                self._unindex_tag(old, tag_key)
+            old._ipam = None
+        self.cidrs[key] = cidr
+        cidr._ipam = self
+        for tag_key in cidr.tags:
+            self._index_tag(cidr, tag_key)
+        
+        # Once the hierarchy is built, splice new CIDRs into it rather than rebuilding
+        if self._cidrs_loaded:
+            node = self.cidr_tree.cidr_map.get(key)
+            if node is None:
+                self.cidr_tree.add_cidr(cidr)
+            else:
+                node.cidr_obj = cidr
+            if cidr._version == 4:
+                v4_tables.add(cidr)
 
     def _load_cidrs_from_file(self, file_path: str) -> List[CIDR]:
         """Helper to load CIDRs from a file and return a list of CIDR objects"""
-        cidr_objects = []
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            for cidr_data in data.get('cidrs', []):
-                cidr = CIDR(
-                    cidr=cidr_data['cidr'],
-                    cidr_type='STATIC',
-                    tags=cidr_data.get('tags', {})
-                )
-                cidr_objects.append(cidr)
-        return cidr_objects
-
-    def _get_all_cidrs(self) -> List[CIDR]:
-        """Get all CIDRs from both static and cloud sources"""
-        all_cidrs = list(self.cidrs.values())
+        data = _read_json(file_path)
+        return [CIDR(cidr_data['cidr'], 'STATIC', _copy_tags(cidr_data.get('tags') or {}))
+                for cidr_data in data.get('cidrs', [])]
+
+    def _iter_all_cidrs(self) -> Iterator[CIDR]:
+        """Yield all CIDRs from both static and cloud sources"""
+        yield from self.cidrs.values()
         
         if self.cloud_provider:
             try:
                 cloud_cidrs = self.cloud_provider.get_cidr_blocks()
-                all_cidrs.extend(cloud_cidrs)
             except Exception as e:
                 print(f"Warning: Failed to load cloud CIDRs: {e}", file=sys.stderr)
-                
-        return all_cidrs
+            else:
+                yield from cloud_cidrs
 
     def _build_cidr_hierarchy(self) -> None:
         """Build the CIDR hierarchy using the more efficient build_tree_from_list"""
-        all_cidrs = self._get_all_cidrs()
-        self.cidr_tree.build_tree_from_list(all_cidrs)
+        # Streamed straight into the tree rather than collected into a list first
+        self.cidr_tree.build_tree_from_list(self._iter_all_cidrs())
+        
+        v4_tables = _V4Tables()
+        for cidr in self.cidrs.values():
+            if cidr._version == 4:
+                v4_tables.add(cidr)
+        self._v4_tables = v4_tables
+
+    def add_cidrs(self, cidrs: Iterable[CIDR]) -> None:
+        """Add already-built CIDRs, e.g. from CIDR.from_records
+        
+        CIDRs are indexed by tag and, if the hierarchy is already built,
+        added to it in place. A CIDR replaces any loaded one for the same network.
+        """
+        self._store_cidrs(cidrs)
 
     def load_static_cidrs(self, file_path: str) -> None:
-        """Load CIDRs from a static file"""
+        """Load CIDRs from a static file
+        
+        If the hierarchy is already built, the new CIDRs are added to it in
+        place. CIDRs the hierarchy took from cloud_provider.get_cidr_blocks()
+        are not re-read; call build_hierarchy() to pick up provider changes.
+        """
         try:
-            cidr_objects = self._load_cidrs_from_file(file_path)
-            for cidr in cidr_objects:
-                self.cidrs[str(cidr.cidr)] = cidr
-            
-            if self._cidrs_loaded:
-                self._build_cidr_hierarchy()
-                
+            self._store_cidrs(self._load_cidrs_from_file(file_path))
+
         except Exception as e:
             print(f"Error loading static CIDRs: {e}", file=sys.stderr)
             raise
 
     def load_cloud_cidrs(self) -> None:
-        """Load CIDRs from the configured cloud provider"""
+        """Load CIDRs from the configured cloud provider
+        
+        If the hierarchy is already built, the new CIDRs are added to it in
+        place. CIDRs the hierarchy took from cloud_provider.get_cidr_blocks()
+        are not re-read; call build_hierarchy() to pick up provider changes.
+        """
         if not self.cloud_provider:
             return
             
         try:
             cidr_data = self.cloud_provider.load_cidrs()
-            for cidr_info in cidr_data.get('cidrs', []):
-                cidr = CIDR(
-                    cidr=cidr_info['cidr'],
-                    cidr_type='VPC',
-                    tags=cidr_info.get('tags', {})
-                )
-                self.cidrs[str(cidr.cidr)] = cidr
-            
-            if self._cidrs_loaded:
-                self._build_cidr_hierarchy()
+            # Tags are copied: the provider may cache and reuse its parsed data
+            self._store_cidrs([CIDR(cidr_info['cidr'], 'VPC', _copy_tags(cidr_info.get('tags') or {}))
+                               for cidr_info in cidr_data.get('cidrs', [])])
                 
         except Exception as e:
             print(f"Error loading cloud CIDRs: {e}", file=sys.stderr)
@@ -216,103 +471,182 @@ class IPAM:
 
     def build_hierarchy(self) -> None:
         """Build or rebuild the CIDR hierarchy with all loaded CIDRs"""
-        self._build_cidr_hierarchy()
-        self._cidrs_loaded = True
+        with self._lock:
+            self._build_cidr_hierarchy()
+            self._cidrs_loaded = True
 
     def get_all_cidrs(self) -> Dict[str, CIDR]:
         """Get all loaded CIDRs"""
-        return self.cidrs.copy()  # Return a copy to prevent external modifications
+        with self._lock:
+            return self.cidrs.copy()  # Return a copy to prevent external modifications
 
     def get_cidr(self, cidr_str: str) -> Optional[CIDR]:
         """Get a specific CIDR by its string representation"""
-        return self.cidrs.get(cidr_str)
+        with self._lock:
+            return self.cidrs.get(cidr_str)
 
     def find_containing_cidr(self, ip_address: str) -> Optional[CIDR]:
         """Find the smallest CIDR that contains the given IP address"""
+        if not self.cidrs:
+            return None
         try:
-            from ipaddress import ip_address as parse_ip
-            ip = parse_ip(ip_address)
-            
             # If we have a built tree, use it for more efficient lookup
             if self._cidrs_loaded:
-                # Find all containing CIDRs and return the most specific one
-                containing_cidrs = []
-                for cidr in self.cidrs.values():
-                    if ip in cidr.cidr:
-                        containing_cidrs.append(cidr)
-                
-                if not containing_cidrs:
-                    return None
-                    
-                # Return the CIDR with the longest prefix (most specific)
-                return max(containing_cidrs, key=lambda c: c.cidr.prefixlen)
+                return self._find_in_hierarchy(ip_address)
             else:
                 # Fallback to linear search if hierarchy isn't built
-                for cidr in self.cidrs.values():
-                    if ip in cidr.cidr:
-                        return cidr
+                version, ip_int = _parse_ip(ip_address)
+                with self._lock:
+                    for cidr in self.cidrs.values():
+                        if cidr._version == version and (ip_int & cidr._mask_int) == cidr._net_int:
+                            return cidr
                 return None
                 
         except ValueError:
             return None
 
-    def get_cidr_tags(self, cidr: str) -> Dict[str, str]:
-        """Get tags for a specific CIDR"""
-        cidr_obj = self.cidrs.get(cidr)
+    def _find_in_hierarchy(self, ip_address: str) -> Optional[CIDR]:
+        """Most specific CIDR containing ip_address, once the hierarchy is built.
+
+        Raises ValueError if ip_address is not a valid IP address.
+        """
+        version, addr = _parse_ip(ip_address)
+        if version == 4:
+            # Published tables are never modified, so no lock is needed
+            return self._v4_tables.find(addr)
+        
+        # Longest-prefix match in the tree's bit trie; walk up past any
+        # CIDR that only the cloud provider knows about
+        with self._lock:
+            node = self.cidr_tree.lookup(ip_address)
+            while node is not None:
+                cidr = self.cidrs.get(node.cidr)
+                if cidr is not None:
+                    return cidr
+                node = node.parent
+        return None
+
+    def find_containing_cidrs(self, ip_addresses: Sequence[str]) -> List[Optional[CIDR]]:
+        """Find the smallest containing CIDR for each IP address in a batch"""
+        # Batches (e.g. from flow logs) repeat addresses heavily; resolve each
+        # distinct address once and fan the answers back out
+        resolved: Dict[str, Optional[CIDR]] = dict.fromkeys(ip_addresses)
+        if not self._cidrs_loaded:
+            for ip in resolved:
+                resolved[ip] = self.find_containing_cidr(ip)
+            return [resolved[ip] for ip in ip_addresses]
+        
+        find = self._find_in_hierarchy
+        for ip in resolved:
+            try:
+                resolved[ip] = find(ip)
+            except ValueError:
+                pass
+        return [resolved[ip] for ip in ip_addresses]
+
+    def get_cidr_tags(self, cidr: str) -> Mapping[str, str]:
+        """Get a read-only, live view of the tags for a specific CIDR"""
+        with self._lock:
+            cidr_obj = self.cidrs.get(cidr)
         if cidr_obj:
             return cidr_obj.get_tags()
-        return {}
+        return _NO_TAGS
 
     def find_cidrs_by_tag(self, key: str, value: str) -> List[CIDR]:
         """Find CIDRs with specific tag"""
-        return [cidr for cidr in self.cidrs.values() 
-               if cidr.tags.get(key) == value]
+        with self._lock:
+            return list(self._tag_index.get((key, value), ()))
 
-    def get_child_cidrs(self, parent_cidr: str) -> List[CIDR]:
-        """Get direct child CIDRs of a given CIDR"""
-        parent = self.cidrs.get(parent_cidr)
-        if not parent:
+    def find_cidrs_by_tags(self, conds: Mapping[str, str], match_all: bool = True) -> List[CIDR]:
+        """Find CIDRs carrying all (or, with match_all=False, any) of the given tags"""
+        if not conds:
             return []
+        with self._lock:
+            tagged = sorted((self._tag_index.get(tag, ()) for tag in conds.items()), key=len)
+            if match_all:
+                # Intersect starting from the rarest tag, so the work is bounded by its size
+                return list(set(tagged[0]).intersection(*tagged[1:]))
+            return list(set().union(*tagged))
 
-        # Get all potential children
-        potential_children = [cidr for cidr in self.cidrs.values() 
-                            if cidr.is_child_of(parent) and str(cidr.cidr) != parent_cidr]
-        
-        # Filter out grandchild CIDRs
-        direct_children = []
-        for cidr in potential_children:
-            # Check if this CIDR is a direct child (not a grandchild)
-            is_direct = True
-            for other in potential_children:
-                if cidr != other and cidr.is_child_of(other):
-                    is_direct = False
-                    break
-            if is_direct:
+    def get_child_cidrs(self, parent_cidr: str) -> List[CIDR]:
+        """Get direct child CIDRs of a given CIDR, in address order.
+
+        Uses the hierarchy once build_hierarchy has been called; before that,
+        the loaded CIDRs are scanned instead, without consulting the cloud
+        provider.
+        """
+        with self._lock:
+            parent = self.cidrs.get(parent_cidr)
+            if not parent:
+                return []
+            if not self._cidrs_loaded:
+                return self._scan_child_cidrs(parent)
+            node = self.cidr_tree.cidr_map.get(parent.cidr_str)
+            if node is None:
+                return []
+
+            # Direct children are the nearest descendants IPAM holds; look through
+            # any CIDRs that only the cloud provider knows about
+            direct_children = []
+            stack = list(reversed(node.children))
+            while stack:
+                child = stack.pop()
+                cidr = self.cidrs.get(child.cidr)
+                if cidr is not None:
+                    direct_children.append(cidr)
+                else:
+                    stack.extend(reversed(child.children))
+
+        return direct_children
+
+    def _scan_child_cidrs(self, parent: CIDR) -> List[CIDR]:
+        """Direct children of parent among the loaded CIDRs, by integer containment"""
+        # In address order, each descendant either starts a new direct child or
+        # falls inside the last one found
+        descendants = sorted((cidr for cidr in self.cidrs.values()
+                              if cidr._prefixlen > parent._prefixlen and parent.is_parent_of(cidr)),
+                             key=lambda cidr: (cidr._net_int, cidr._prefixlen))
+        direct_children: List[CIDR] = []
+        for cidr in descendants:
+            if not direct_children or not direct_children[-1].is_parent_of(cidr):
                 direct_children.append(cidr)
-        
         return direct_children
 
     def find_available_cidr(self, parent_cidr: str, prefix_length: int) -> Optional[CIDR]:
         """Find an available CIDR with specified prefix length under a parent CIDR"""
-        parent = self.cidrs.get(parent_cidr)
-        if not parent:
-            return None
+        with self._lock:
+            parent = self.cidrs.get(parent_cidr)
+            if not parent:
+                return None
 
-        # Get all existing child CIDRs
-        existing_cidrs = set(str(c.cidr) for c in self.get_child_cidrs(parent_cidr))
+            max_prefixlen = 32 if parent._version == 4 else 128
+            if not parent._prefixlen <= prefix_length <= max_prefixlen:
+                raise ValueError(f"Prefix length {prefix_length} is invalid for {parent_cidr}")
 
-        # Generate all possible CIDRs of the requested prefix length
-        possible_cidrs = list(parent.cidr.subnets(new_prefix=prefix_length))
+            # Walk the existing child CIDRs in address order, moving a block-aligned
+            # cursor past each one until a free block fits before the next child
+            block = 1 << (max_prefixlen - prefix_length)
+            end = parent._net_int + (1 << (max_prefixlen - parent._prefixlen))
+            cursor = parent._net_int
+            for child in sorted(self.get_child_cidrs(parent_cidr), key=lambda c: c._net_int):
+                if cursor + block <= child._net_int:
+                    break
+                child_end = child._net_int + (1 << (max_prefixlen - child._prefixlen))
+                if child_end > cursor:
+                    cursor = (child_end + block - 1) // block * block
 
-        # Find the first available CIDR
-        for possible_cidr in possible_cidrs:
-            if str(possible_cidr) not in existing_cidrs:
-                return CIDR(
-                    cidr=str(possible_cidr),
-                    cidr_type='STATIC',
-                    tags={'status': 'available'}
-                )
-        return None
+        if cursor + block > end:
+            return None
+        if parent._version == 4:
+            # Formatted straight from the integer, which CIDR's IPv4 fast path parses
+            cidr_str = f"{socket.inet_ntoa(cursor.to_bytes(4, 'big'))}/{prefix_length}"
+        else:
+            cidr_str = str(ipaddress.IPv6Network((cursor, prefix_length)))
+        return CIDR(
+            cidr=cidr_str,
+            cidr_type='STATIC',
+            tags={'status': 'available'}
+        )
 
 # Example usage:
 if __name__ == "__main__":
@@ -192,6 +192,23 @@ class TestBuildTreeFromList(unittest.TestCase):
         self.assertEqual(len(node_10.children), 1)
         self.assertEqual(node_10.children[0].cidr, "10.1.0.0/16")
     
+    def test_differently_spelled_duplicates(self):
+        """Test two spellings of one network end up as siblings, not nested"""
+        cidrs = ["2001:db8::/32", "2001:DB8::/32", "2001:db8:1::/48"]
+        
+        for build in ("list", "incremental"):
+            with self.subTest(build=build):
+                tree = CIDRTree()
+                if build == "list":
+                    tree.build_tree_from_list(cidrs)
+                else:
+                    for cidr in cidrs:
+                        tree.add_cidr(cidr)
+                
+                self.assertCountEqual([node.cidr for node in tree.roots], ["2001:db8::/32", "2001:DB8::/32"])
+                self.assertEqual([child.cidr for child in tree.cidr_map["2001:db8::/32"].children], ["2001:db8:1::/48"])
+                self.assertEqual(tree.cidr_map["2001:DB8::/32"].children, [])
+    
     def test_ipv6_cidrs(self):
         """Test with IPv6 CIDRs"""
         cidrs = [
@@ -213,6 +230,57 @@ class TestBuildTreeFromList(unittest.TestCase):
         self.assertEqual(len(node_48.children), 1)
         self.assertEqual(node_48.children[0].cidr, "2001:db8:1:1::/64")
 
+    def test_add_cidr_out_of_order(self):
+        """Test that incremental add_cidr nests CIDRs inserted before their parents"""
+        cidrs = [
+            "10.1.1.0/24",
+            "10.1.0.0/16",
+            "10.2.0.0/16",
+            "10.0.0.0/8"
+        ]
+        
+        tree = CIDRTree()
+        for cidr in cidrs:
+            tree.add_cidr(cidr)
+        
+        # Only the /8 should be a root
+        self.assertEqual([node.cidr for node in tree.roots], ["10.0.0.0/8"])
+        
+        # The /24 stays under its /16 rather than moving up to the /8
+        node_10 = tree.cidr_map["10.0.0.0/8"]
+        child_cidrs = [child.cidr for child in node_10.children]
+        self.assertEqual(sorted(child_cidrs), ["10.1.0.0/16", "10.2.0.0/16"])
+        
+        node_10_1_1 = tree.cidr_map["10.1.1.0/24"]
+        self.assertEqual(node_10_1_1.parent.cidr, "10.1.0.0/16")
+
+    def test_lookup(self):
+        """Test finding the most specific CIDR containing an IP address"""
+        cidrs = [
+            "10.0.0.0/8",
+            "10.1.0.0/16",
+            "10.1.1.0/24",
+            "2001:db8::/32",
+            "2001:db8:1::/48"
+        ]
+        
+        tree = CIDRTree()
+        tree.build_tree_from_list(cidrs)
+        
+        self.assertEqual(tree.lookup("10.1.1.7").cidr, "10.1.1.0/24")
+        self.assertEqual(tree.lookup("10.1.2.7").cidr, "10.1.0.0/16")
+        self.assertEqual(tree.lookup("10.200.0.1").cidr, "10.0.0.0/8")
+        self.assertIsNone(tree.lookup("192.168.1.1"))
+        self.assertEqual(tree.lookup("2001:db8:1::5").cidr, "2001:db8:1::/48")
+        self.assertEqual(tree.lookup("2001:db8:2::5").cidr, "2001:db8::/32")
+        
+        # CIDRs added incrementally are found too
+        tree.add_cidr("192.168.0.0/16")
+        self.assertEqual(tree.lookup("192.168.1.1").cidr, "192.168.0.0/16")
+        
+        with self.assertRaises(ValueError):
+            tree.lookup("not-an-ip")
+
 def run_tests():
     """Run the tests and print results"""
     print("Running tests for build_tree_from_list...")
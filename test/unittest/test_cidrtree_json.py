@@ -3,8 +3,10 @@ import json
 import sys
 import os
 
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
-from cidrtree import CIDRTree
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from src.cidrtree import CIDRTree
 
 class TestCIDRTree(unittest.TestCase):
     def test_simple_tree(self):
@@ -109,5 +111,37 @@ class TestCIDRTree(unittest.TestCase):
                 result = json.loads(tree.getCidrTree(None))
                 self.assertEqual(result, case["expected"])
 
+    def test_rebuild_refreshes_tree(self):
+        tree = CIDRTree()
+        tree.formTreeFromCidrList(["10.0.0.0/8", "10.1.0.0/16"])
+        first = tree.getCidrTree(None)
+        self.assertIs(tree.getCidrTree(None), first)
+        subtree = tree.getCidrTree("10.0.0.0/8")
+        self.assertIs(tree.getCidrTree("10.0.0.0/8"), subtree)
+        tree.formTreeFromCidrList(["192.168.0.0/16", "10.0.0.0/8"])
+        result = json.loads(tree.getCidrTree(None))
+        self.assertEqual(result, {"null": {"10.0.0.0/8": {}, "192.168.0.0/16": {}}})
+        self.assertEqual(json.loads(tree.getCidrTree("10.0.0.0/8")), {"10.0.0.0/8": {}})
+
+    def test_add_cidr_refreshes_tree(self):
+        tree = CIDRTree()
+        tree.formTreeFromCidrList(["10.0.0.0/8"])
+        self.assertEqual(json.loads(tree.getCidrTree(None)), {"null": {"10.0.0.0/8": {}}})
+        tree.add_cidr("10.1.0.0/16")
+        self.assertEqual(json.loads(tree.getCidrTree(None)), {"null": {"10.0.0.0/8": {"10.1.0.0/16": {}}}})
+        self.assertEqual(json.loads(tree.getCidrTree("192.168.0.0/16")), {})
+
+    def test_host_bits_are_masked(self):
+        tree = CIDRTree()
+        tree.formTreeFromCidrList(["10.0.0.1/8", "10.1.2.3/16"])
+        self.assertEqual(json.loads(tree.getCidrTree(None)), {"null": {"10.0.0.0/8": {"10.1.0.0/16": {}}}})
+
+    def test_scoped_ipv6_keys_are_escaped(self):
+        tree = CIDRTree()
+        cidrs = ['fe80::%eth"0/64', 'fe80::%eth"0/80']
+        tree.formTreeFromCidrList(cidrs)
+        self.assertEqual(json.loads(tree.getCidrTree(None)), {"null": {cidrs[0]: {cidrs[1]: {}}}})
+        self.assertEqual(json.loads(tree.getCidrTree(cidrs[0])), {cidrs[0]: {cidrs[1]: {}}})
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,18 +1,22 @@
 import os
 import sys
 import unittest
+from unittest import mock
 
 # Add the parent directory to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from src.ipam import IPAM, TestProvider, CIDR
 import tempfile
+import threading
 import json
+import ipaddress
 
 class TestIPAM(unittest.TestCase):
-    def setUp(self):
-        # Create a temporary test file
-        self.test_file = tempfile.NamedTemporaryFile(delete=False)
+    @classmethod
+    def setUpClass(cls):
+        # Create a temporary test file, shared by all tests (they only read it)
+        cls.test_file = tempfile.NamedTemporaryFile(delete=False)
         test_data = {
             "cidrs": [
                 {
@@ -41,19 +45,20 @@ class TestIPAM(unittest.TestCase):
                 }
             ]
         }
-        with open(self.test_file.name, 'w') as f:
+        with open(cls.test_file.name, 'w') as f:
             json.dump(test_data, f)
 
+    @classmethod
+    def tearDownClass(cls):
+        # Clean up temporary file
+        cls.test_file.close()
+        os.unlink(cls.test_file.name)
+
+    def setUp(self):
         # Create IPAM instance with test provider
         self.provider = TestProvider(self.test_file.name)
         self.ipam = IPAM(cloud_provider=self.provider)
 
-    def tearDown(self):
-        # Clean up temporary file
-        self.test_file.close()
-        import os
-        os.unlink(self.test_file.name)
-
     def test_load_cidrs(self):
         """Test loading CIDRs from both static file and cloud provider"""
         # Create temporary static CIDRs file
@@ -80,10 +85,60 @@ class TestIPAM(unittest.TestCase):
         self.assertIn("10.0.0.0/8", self.ipam.cidrs)
         self.assertIn("192.168.0.0/16", self.ipam.cidrs)
 
+        # Tag keys from both sources share one interned string
+        static_key = next(iter(self.ipam.cidrs["192.168.0.0/16"].tags))
+        cloud_key = next(iter(self.ipam.cidrs["10.0.0.0/8"].tags))
+        self.assertIs(static_key, cloud_key)
+
         # Clean up
         import os
         os.unlink(static_file.name)
 
+    def test_provider_reuses_parsed_file(self):
+        """Test the provider only re-parses its file after it changes"""
+        data = self.provider.load_cidrs()
+        self.assertIs(self.provider.load_cidrs(), data)
+
+        # Tag edits on loaded CIDRs don't leak into the cached data
+        self.ipam.load_cloud_cidrs()
+        self.ipam.get_cidr("10.0.0.0/8").add_tag("environment", "dev")
+        self.assertEqual(data["cidrs"][0]["tags"]["environment"], "prod")
+
+        # A changed file is parsed again; this uses its own file as the shared one must not change
+        with tempfile.NamedTemporaryFile(delete=False, mode='w') as changing_file:
+            json.dump(data, changing_file)
+        self.addCleanup(os.unlink, changing_file.name)
+        provider = TestProvider(changing_file.name)
+        provider.load_cidrs()
+        with open(changing_file.name, 'w') as f:
+            json.dump({"cidrs": [{"cidr": "172.16.0.0/12"}]}, f)
+        stat = os.stat(changing_file.name)
+        os.utime(changing_file.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertEqual([c.cidr_str for c in provider.get_cidr_blocks()], ["172.16.0.0/12"])
+
+    def test_provider_null_tags(self):
+        """Test cloud records with "tags": null load with empty tags"""
+        with tempfile.NamedTemporaryFile(delete=False, mode='w') as cloud_file:
+            json.dump({"cidrs": [{"cidr": "172.16.0.0/12", "tags": None}]}, cloud_file)
+        self.addCleanup(os.unlink, cloud_file.name)
+        provider = TestProvider(cloud_file.name)
+        self.assertEqual([c.tags for c in provider.get_cidr_blocks()], [{}])
+
+        ipam = IPAM(cloud_provider=provider)
+        ipam.load_cloud_cidrs()
+        self.assertEqual(ipam.get_cidr("172.16.0.0/12").tags, {})
+
+    def test_static_null_tags(self):
+        """Test static and in-memory records with "tags": null load with empty tags"""
+        with tempfile.NamedTemporaryFile(delete=False, mode='w') as static_file:
+            json.dump({"cidrs": [{"cidr": "192.168.0.0/16", "tags": None}]}, static_file)
+        self.addCleanup(os.unlink, static_file.name)
+        self.ipam.load_static_cidrs(static_file.name)
+        self.assertEqual(self.ipam.get_cidr("192.168.0.0/16").tags, {})
+
+        cidrs = CIDR.from_records([{"cidr": "172.16.0.0/12", "tags": None}])
+        self.assertEqual(cidrs["172.16.0.0/12"].tags, {})
+
     def test_get_cidr_tags(self):
         """Test getting tags for a specific CIDR"""
         self.ipam.load_cloud_cidrs()
@@ -111,6 +166,21 @@ class TestIPAM(unittest.TestCase):
         self.assertEqual(len(web_cidrs), 1)
         self.assertEqual(str(web_cidrs[0].cidr), "10.1.0.0/16")
 
+        # Tag changes after loading are reflected
+        self.ipam.get_cidr("10.2.0.0/16").add_tag("purpose", "web")
+        self.ipam.get_cidr("10.1.0.0/16").remove_tag("purpose")
+        web_cidrs = self.ipam.find_cidrs_by_tag("purpose", "web")
+        self.assertEqual([str(c.cidr) for c in web_cidrs], ["10.2.0.0/16"])
+        self.assertEqual(self.ipam.find_cidrs_by_tag("purpose", "db"), [])
+
+        # Compound queries
+        both = self.ipam.find_cidrs_by_tags({"environment": "prod", "purpose": "web"})
+        self.assertEqual([str(c.cidr) for c in both], ["10.2.0.0/16"])
+        self.assertEqual(self.ipam.find_cidrs_by_tags({"environment": "prod", "purpose": "db"}), [])
+        either = self.ipam.find_cidrs_by_tags({"purpose": "web", "purpose2": "x"}, match_all=False)
+        self.assertEqual([str(c.cidr) for c in either], ["10.2.0.0/16"])
+        self.assertEqual(len(self.ipam.find_cidrs_by_tags({"environment": "prod", "purpose": "base"}, match_all=False)), 3)
+
     def test_get_child_cidrs(self):
         """Test getting direct child CIDRs"""
         self.ipam.load_cloud_cidrs()
@@ -131,6 +201,103 @@ class TestIPAM(unittest.TestCase):
         non_existent = self.ipam.get_child_cidrs("10.0.0.0/24")
         self.assertEqual(len(non_existent), 0)
 
+    def test_get_child_cidrs_without_hierarchy(self):
+        """Test child lookups before build_hierarchy scan the loaded CIDRs without calling the provider"""
+        self.ipam.load_cloud_cidrs()
+        with tempfile.NamedTemporaryFile(delete=False, mode='w') as static_file:
+            json.dump({"cidrs": [{"cidr": "10.1.4.0/24"}, {"cidr": "10.1.4.128/25"}, {"cidr": "10.3.0.0/16"}]}, static_file)
+        self.addCleanup(os.unlink, static_file.name)
+        self.ipam.load_static_cidrs(static_file.name)
+
+        with mock.patch.object(self.provider, 'get_cidr_blocks', side_effect=AssertionError("provider called")):
+            scanned = {cidr: [c.cidr_str for c in self.ipam.get_child_cidrs(cidr)] for cidr in self.ipam.cidrs}
+        self.assertEqual(scanned["10.0.0.0/8"], ["10.1.0.0/16", "10.2.0.0/16", "10.3.0.0/16"])
+        self.assertEqual(scanned["10.1.0.0/16"], ["10.1.4.0/24"])
+        self.assertEqual(scanned["10.1.4.0/24"], ["10.1.4.128/25"])
+
+        # Same answers as the hierarchy gives
+        self.ipam.build_hierarchy()
+        self.assertEqual({cidr: [c.cidr_str for c in self.ipam.get_child_cidrs(cidr)] for cidr in self.ipam.cidrs},
+                         scanned)
+
+    def test_find_containing_cidr(self):
+        """Test finding the most specific CIDR containing an IP"""
+        self.ipam.load_cloud_cidrs()
+        
+        # Linear fallback before the hierarchy is built
+        self.assertTrue(self.ipam.find_containing_cidr("10.1.2.3").is_parent_of(CIDR("10.1.2.3/32", "STATIC")))
+        self.assertIsNone(self.ipam.find_containing_cidr("2001:db8::1"))
+        self.assertTrue(self.ipam.find_containing_cidr(ipaddress.ip_address("10.1.2.3")).is_parent_of(CIDR("10.1.2.3/32", "STATIC")))
+        self.assertIsNone(self.ipam.find_containing_cidr(ipaddress.ip_address("2001:db8::1")))
+        
+        self.ipam.build_hierarchy()
+        
+        self.assertEqual(str(self.ipam.find_containing_cidr("10.1.2.3").cidr), "10.1.0.0/16")
+        self.assertEqual(str(self.ipam.find_containing_cidr("10.3.0.1").cidr), "10.0.0.0/8")
+        self.assertIsNone(self.ipam.find_containing_cidr("192.168.0.1"))
+        self.assertIsNone(self.ipam.find_containing_cidr("not-an-ip"))
+
+        # Batch form matches the single-IP results
+        ips = ["10.1.2.3", "10.3.0.1", "192.168.0.1", "not-an-ip", "10.1.2.3"]
+        self.assertEqual(self.ipam.find_containing_cidrs(ips),
+                         [self.ipam.find_containing_cidr(ip) for ip in ips])
+
+        # Address objects and ints are accepted as well as strings
+        addr = ipaddress.ip_address("10.1.2.3")
+        self.assertEqual(str(self.ipam.find_containing_cidr(addr).cidr), "10.1.0.0/16")
+        self.assertEqual(str(self.ipam.find_containing_cidr(int(addr)).cidr), "10.1.0.0/16")
+        self.assertEqual(self.ipam.find_containing_cidrs([addr, "10.3.0.1"]),
+                         [self.ipam.find_containing_cidr("10.1.2.3"), self.ipam.find_containing_cidr("10.3.0.1")])
+
+    def test_load_after_build_updates_hierarchy(self):
+        """Test CIDRs loaded after the hierarchy is built are added to it"""
+        self.ipam.load_cloud_cidrs()
+        self.ipam.build_hierarchy()
+
+        with tempfile.NamedTemporaryFile(delete=False, mode='w') as static_file:
+            json.dump({"cidrs": [{"cidr": "10.1.0.0/20"}, {"cidr": "10.0.0.0/12"}]}, static_file)
+        self.addCleanup(os.unlink, static_file.name)
+        self.ipam.load_static_cidrs(static_file.name)
+
+        self.assertEqual([str(c.cidr) for c in self.ipam.get_child_cidrs("10.0.0.0/8")], ["10.0.0.0/12"])
+        self.assertEqual([str(c.cidr) for c in self.ipam.get_child_cidrs("10.0.0.0/12")], ["10.1.0.0/16", "10.2.0.0/16"])
+        self.assertEqual(str(self.ipam.find_containing_cidr("10.1.2.3").cidr), "10.1.0.0/20")
+
+    def test_concurrent_loads_and_lookups(self):
+        """Test lookups running alongside loads always see a consistent state"""
+        self.ipam.load_cloud_cidrs()
+        self.ipam.build_hierarchy()
+
+        with tempfile.NamedTemporaryFile(delete=False, mode='w') as static_file:
+            json.dump({"cidrs": [{"cidr": f"10.1.{i}.0/24"} for i in range(64)]}, static_file)
+        self.addCleanup(os.unlink, static_file.name)
+        errors = []
+
+        def load():
+            try:
+                for _ in range(5):
+                    self.ipam.load_static_cidrs(static_file.name)
+            except Exception as e:
+                errors.append(e)
+
+        def lookup():
+            try:
+                for _ in range(200):
+                    found = self.ipam.find_containing_cidr("10.1.5.1")
+                    self.assertIn(str(found.cidr), ("10.1.0.0/16", "10.1.5.0/24"))
+                    self.ipam.get_child_cidrs("10.1.0.0/16")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=load)] + [threading.Thread(target=lookup) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.ipam.get_child_cidrs("10.1.0.0/16")), 64)
+
     def test_find_available_cidr(self):
         """Test finding available CIDRs"""
         self.ipam.load_cloud_cidrs()
@@ -147,5 +314,10 @@ class TestIPAM(unittest.TestCase):
         self.assertEqual(subnet_available.cidr_type, "STATIC")
         self.assertEqual(subnet_available.tags["status"], "available")
 
+        # Blocks overlapping existing children are skipped
+        self.assertEqual(str(self.ipam.find_available_cidr("10.0.0.0/8", 15).cidr), "10.4.0.0/15")
+        with self.assertRaises(ValueError):
+            self.ipam.find_available_cidr("10.1.0.0/16", 8)
+
 if __name__ == '__main__':
     unittest.main()
@@ -39,6 +39,11 @@ class TestCIDRWithTree(unittest.TestCase):
         
         self.assertEqual(len(self.cidr3.children), 0)
         self.assertEqual(len(self.cidr4.children), 0)
+        
+        # Children follow later changes to the tree
+        cidr5 = CIDR("10.2.0.0/16", "subnet")
+        self.cidr1._tree.add_cidr(cidr5)
+        self.assertEqual(self.cidr1.children, [self.cidr2, cidr5])
     
     def test_hierarchy_methods(self):
         """Test hierarchy-related methods"""
@@ -50,6 +55,22 @@ class TestCIDRWithTree(unittest.TestCase):
         self.assertTrue(self.cidr2.is_child_of(self.cidr1))
         self.assertFalse(self.cidr4.is_child_of(self.cidr1))
     
+    def test_parsing(self):
+        """Test CIDR strings parse the same as ipaddress.ip_network"""
+        import ipaddress
+        for text in ("10.0.0.0/8", "10.1.1.0/24", "0.0.0.0/0", "10.0.0.0/255.0.0.0", "2001:db8::/32"):
+            cidr = CIDR(text, "network")
+            self.assertEqual(cidr.cidr, ipaddress.ip_network(text))
+            self.assertEqual(cidr.cidr_str, str(ipaddress.ip_network(text)))
+        for text in ("10.0.0.1/8", "10.0.0.0/33", "10.1/16", "01.0.0.0/8"):
+            with self.assertRaises(ValueError):
+                CIDR(text, "network")
+
+        # An ipaddress network object is used without re-parsing
+        network = ipaddress.ip_network("2001:db8::/32")
+        self.assertIs(CIDR(network, "network").cidr, network)
+        self.assertEqual(CIDR(ipaddress.ip_network("10.0.0.0/8"), "network").cidr_str, "10.0.0.0/8")
+    
     def test_tags(self):
         """Test tag management"""
         self.cidr1.add_tag("environment", "prod")
@@ -58,6 +79,17 @@ class TestCIDRWithTree(unittest.TestCase):
         self.cidr1.remove_tag("environment")
         self.assertEqual(self.cidr1.get_tags(), {})
 
+        # The returned tags are a read-only view that follows later changes
+        tags = self.cidr1.get_tags()
+        with self.assertRaises(TypeError):
+            tags["environment"] = "dev"
+        self.cidr1.add_tag("environment", "dev")
+        self.assertEqual(tags, {"environment": "dev"})
+
+        # Replacing the tags dict is reflected too
+        self.cidr1.tags = {"purpose": "web"}
+        self.assertEqual(self.cidr1.get_tags(), {"purpose": "web"})
+
 def run_tests():
     """Run the tests and print results"""
     print("Running tests for updated IPAM with CIDRTree...")